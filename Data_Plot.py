@@ -1,55 +1,216 @@
+import argparse
+import os
+import sys
 import numpy as np
+import matplotlib as mpl
+
+# The native macOS backend skips Agg's fast raster path; use the Agg-based Tk backend instead,
+# but only in place of the default backend, never over a backend chosen with MPLBACKEND
+if sys.platform == 'darwin' and 'MPLBACKEND' not in os.environ and mpl.get_backend().lower() == 'macosx':
+    try:
+        import tkinter  # Not every Python build ships Tk (e.g. Homebrew Python without python-tk)
+        mpl.use('TkAgg')
+    except ImportError:
+        pass  # Keep the native backend
+
 import matplotlib.pyplot as plt
 
-def load_npy(file_path, samples=None):
-    adc_data = np.load(file_path)
-    if samples:
-        if samples > 0:
-            adc_data = adc_data[-samples:]
-        else:
-            adc_data = adc_data[:samples]
-    return adc_data.astype(np.float64)
+# Merge sub-pixel vertices aggressively and let Agg draw long paths in chunks
+mpl.rcParams['path.simplify'] = True
+mpl.rcParams['path.simplify_threshold'] = 1.0
+mpl.rcParams['agg.path.chunksize'] = 10000
+
+def sample_dtype(dtype):
+    # 8/16-bit ADC codes are kept as integers and rescaled through a lookup table; anything else becomes float32
+    dtype = np.dtype(dtype)
+    return dtype if dtype.kind == 'i' and dtype.itemsize <= 2 else np.dtype(np.float32)
+
+def read_npy_header(f):
+    # Parse the .npy header and leave f positioned at the first sample
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+    return int(np.prod(shape)), dtype
+
+def load_npy(file_path, start=0, count=None):
+    # Seek past the header to the requested window so only its bytes are read from disk
+    with open(file_path, 'rb') as f:
+        n, dtype = read_npy_header(f)
+        start = min(max(start, 0), n)
+        count = n - start if count is None else min(max(count, 0), n - start)  # np.fromfile reads to the end for count < 0
+        f.seek(start * dtype.itemsize, os.SEEK_CUR)
+        adc_data = np.fromfile(f, dtype=dtype, count=count)
+    return adc_data.astype(sample_dtype(dtype), copy=False)
+
+def read_batch_index(file_path):
+    # PicoProbe writes batches.idx next to the channel files: one (batch_number, first_sample, n_samples, acquired_sample) row per batch
+    index_path = os.path.join(os.path.dirname(os.path.abspath(file_path)), 'batches.idx')
+    if not os.path.exists(index_path):
+        return None
+    return np.fromfile(index_path, dtype=np.int64).reshape(-1, 4)
+
+def select_window(index, batch=None, transition=None, start=None, count=None):
+    # Returns (start, count, transition_point) in samples of the channel file; count None reads to the end
+    if transition is not None:
+        # TRANSITION_SAMPLES either side of where `transition` starts, to check the join with the batch before it
+        first = int(index[transition, 1])
+        window_start = max(first - TRANSITION_SAMPLES, 0)
+        return window_start, first + TRANSITION_SAMPLES - window_start, first - window_start
+    if start is not None or index is None:
+        return start or 0, count, None
+    _, first, n_samples, _ = index[batch or 0]
+    return int(first), int(n_samples), None
+
+def dropped_before(index, batch):
+    # Samples dropped by PicoProbe between `batch` and the one before it (0 if the batches are contiguous)
+    if batch == 0:
+        return int(index[0, 3] - index[0, 1])
+    return int((index[batch, 3] - index[batch, 1]) - (index[batch - 1, 3] - index[batch - 1, 1]))
+
+def min_max_envelope(dt, mv_data, width_px):
+    # Reduce the trace to one (min, max) pair per pixel column; the drawn line looks the same
+    bucket = len(mv_data) // width_px
+    chunks = mv_data[:bucket * width_px].reshape(width_px, bucket)
+    envelope = np.empty(2 * width_px, dtype=mv_data.dtype)
+    envelope[0::2] = chunks.min(axis=1)
+    envelope[1::2] = chunks.max(axis=1)
+    return np.repeat(np.arange(width_px) * (bucket * dt), 2), envelope
 
-def process_and_plot_data(adc_data, voltage_range, sampling_interval_ns, file_paths):
-    print(f"ADC data - min: {np.min(adc_data)}, max: {np.max(adc_data)}")
-    
+def adc_to_mv_lut(dtype, adc_min, scale):
+    # One float32 entry per possible ADC code, stored in the order of the codes' unsigned bit patterns
+    codes = np.arange(1 << (8 * dtype.itemsize), dtype=f'u{dtype.itemsize}').view(dtype)
+    return np.subtract(codes, adc_min, dtype=np.float32) * scale
+
+def normalize(adc_data, voltage_range, inplace=False):
+    # Map [adc_min, adc_max] onto [0, voltage_range] mV as float32; kept free of plotting so repeated runs can reuse it.
+    # adc_data is left untouched unless inplace=True, which lets a writable float32 adc_data hold the result
     adc_min, adc_max = np.min(adc_data), np.max(adc_data)
-    mv_data = (adc_data - adc_min) * (voltage_range * 1000) / (adc_max - adc_min)
+    adc_span = float(adc_max) - float(adc_min)
+    # A flat trace (e.g. an idle or disconnected channel) has no span to scale, so map it to 0 mV
+    scale = np.float32(voltage_range * 1000 / adc_span if adc_span else 0.0)  # float32 scalar keeps mv_data in float32
+    if adc_data.dtype.kind == 'i' and adc_data.size > (1 << (8 * adc_data.dtype.itemsize)):
+        # Integer ADC codes: a table lookup replaces the per-sample subtract and multiply
+        unsigned_codes = adc_data.view(f'u{adc_data.dtype.itemsize}')
+        mv_data = np.take(adc_to_mv_lut(adc_data.dtype, adc_min, scale), unsigned_codes)
+    else:
+        # Rescale in place only when the caller gives up adc_data and it is already a writable float32 buffer
+        mv_data = adc_data if inplace and adc_data.dtype == np.float32 and adc_data.flags.writeable else None
+        mv_data = np.subtract(adc_data, adc_min, out=mv_data, dtype=np.float32)
+        mv_data *= scale
+    return mv_data, adc_min, adc_max
+
+class Plotter:
+    # Keeps one figure, axes and line alive so repeated captures only swap the line's data
+    def __init__(self, dpi=80):
+        self.dpi = dpi
+        self.fig = None
+
+    def _build(self):
+        self.fig = plt.figure(figsize=(12, 6), dpi=self.dpi)  # rasterisation cost scales with the pixel count
+        self.ax = self.fig.gca()
+        (self.line,) = self.ax.plot([], [], rasterized=True)  # drawn as one image in vector outputs (PDF/SVG)
+        # axvline spans the axes in y, so only the closed-form x of the transition is needed
+        self.marker = self.ax.axvline(x=0.0, color='r', linestyle='--', label='Batch Transition', visible=False)
+        self.ax.set_title('PicoScope Data Visualization')
+        self.ax.set_xlabel('Time (s)')
+        self.ax.set_ylabel('Voltage (mV)')
+        self.ax.grid(True)
+
+    def plot(self, mv_data, dt, transition_point=None):
+        if self.fig is None:
+            self._build()
+
+        width_px = int(self.fig.get_figwidth() * self.fig.dpi)
+        if len(mv_data) > 4 * width_px:
+            plot_time, plot_data = min_max_envelope(dt, mv_data, width_px)
+        else:
+            plot_time, plot_data = np.linspace(0.0, (len(mv_data) - 1) * dt, len(mv_data)), mv_data
+        self.line.set_data(plot_time, plot_data)
+
+        self.marker.set_visible(transition_point is not None)
+        if transition_point is not None:
+            self.marker.set_xdata([transition_point * dt] * 2)
+            self.ax.legend(loc='upper right')
+        elif self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
 
-    time = np.arange(0, len(mv_data)) * (sampling_interval_ns / 1e9)
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.fig.canvas.draw_idle()
+        return self.fig
 
-    plt.figure(figsize=(12, 6))
-    plt.plot(time, mv_data)
-    plt.title('PicoScope Data Visualization')
-    plt.xlabel('Time (s)')
-    plt.ylabel('Voltage (mV)')
-    plt.grid(True)
+def process_and_plot_data(adc_data, voltage_range, sampling_interval_ns, transition_point=None, dpi=80, verbose=False,
+                          plotter=None, out_path=None):
+    mv_data, adc_min, adc_max = normalize(adc_data, voltage_range, inplace=True)  # Consumes adc_data: a writable float32 array is overwritten
+    if verbose:
+        print(f"ADC data - min: {adc_min}, max: {adc_max}")
 
-    if len(file_paths) > 1:
-        transition_point = len(mv_data) // 2
-        plt.axvline(x=time[transition_point], color='r', linestyle='--', label='File Transition')
-        plt.legend(loc='upper right')
+    # The time axis is uniform, so only the plotted points get a timestamp
+    dt = sampling_interval_ns * 1e-9
+    duration = (len(mv_data) - 1) * dt
 
-    plt.show()
+    plotter = plotter or Plotter(dpi)
+    fig = plotter.plot(mv_data, dt, transition_point=transition_point)
+    if out_path:
+        # Batch mode: render straight to file, no GUI event loop
+        fig.savefig(out_path)
+        plt.close(fig)
+        plotter.fig = None
+    else:
+        plt.show()
 
     print(f"Data shape: {mv_data.shape}")
-    print(f"Time range: {time[-1]:.9f} seconds")
-    print(f"Voltage data min: {np.min(mv_data):.2f} mV, max: {np.max(mv_data):.2f} mV")
+    print(f"Time range: {duration:.9f} seconds")
+    # The rescale maps [adc_min, adc_max] onto [0, voltage_range] exactly (a flat trace onto 0), so the extrema need no scan
+    print(f"Voltage data min: {0.0:.2f} mV, max: {voltage_range * 1000.0 if adc_max > adc_min else 0.0:.2f} mV")
+
+TRANSITION_SAMPLES = 10000  # Samples plotted on each side of a batch transition
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+parser = argparse.ArgumentParser(description='Plot a window of a PicoScope channel_<x>.npy recording.')
+window = parser.add_mutually_exclusive_group()
+window.add_argument('--batch', type=int, metavar='N', help='plot batch N, as listed in batches.idx next to the file (default: 0)')
+window.add_argument('--transition', type=int, metavar='N',
+                    help=f'plot {TRANSITION_SAMPLES} samples on each side of the start of batch N, marking the transition')
+window.add_argument('--start', type=int, metavar='SAMPLE', help='plot from this sample of the file instead of a batch')
+parser.add_argument('--count', type=positive_int, metavar='SAMPLES', help='number of samples to plot with --start (default: to the end)')
+parser.add_argument('--publication', action='store_true', help='render at 200 dpi for final figures (default: 80 dpi)')
+parser.add_argument('--verbose', action='store_true', help='print the raw ADC min/max before plotting')
+parser.add_argument('--save', metavar='PATH', help='save the plot to PATH (e.g. plot.png) instead of opening a window')
+args = parser.parse_args()
+if args.save:
+    plt.switch_backend('Agg')  # headless: no GUI toolkit needed to write the file
 
 # 사용자 입력
-file_paths = input("Enter the path(s) to your .npy file(s), separated by comma if two files: ").split(',')
-file_paths = [path.strip() for path in file_paths]
+file_path = input("Enter the path to your .npy file: ").strip()
 voltage_range = float(input("Enter the voltage range (in Volts): "))
 sampling_interval_ns = float(input("Enter the sampling interval (in ns): "))
 
-if len(file_paths) == 1:
-    adc_data = load_npy(file_paths[0])
-elif len(file_paths) == 2:
-    adc_data1 = load_npy(file_paths[0], samples=-10000)
-    adc_data2 = load_npy(file_paths[1], samples=10000)
-    adc_data = np.concatenate((adc_data1, adc_data2))
-else:
-    print("Please enter either one or two file paths.")
+# A recording is one file per channel, so only the chosen window is read: a batch from batches.idx or the --start/--count
+# range. A recording without batches.idx is read from --start (or its first sample) to the end unless --count is given
+index = read_batch_index(file_path)
+batch = args.transition if args.transition is not None else args.batch
+if args.start is None and index is not None:
+    batch = batch or 0
+    first_batch = 1 if args.transition is not None else 0  # A transition joins a batch to the one before it
+    if not first_batch <= batch < len(index):
+        print(f"Please choose a batch between {first_batch} and {len(index) - 1}.")
+        exit()
+    print(f"Batch {batch}: samples {int(index[batch, 1])}-{int(index[batch, 1] + index[batch, 2]) - 1} of the file")
+    if dropped_before(index, batch):
+        print(f"{dropped_before(index, batch)} samples were dropped during the recording just before batch {batch}")
+elif batch is not None:
+    print("--batch and --transition need the batches.idx file next to the .npy file.")
     exit()
+start, count, transition_point = select_window(index, args.batch, args.transition, args.start, args.count)
 
-process_and_plot_data(adc_data, voltage_range, sampling_interval_ns, file_paths)
\ No newline at end of file
+adc_data = load_npy(file_path, start, count)
+process_and_plot_data(adc_data, voltage_range, sampling_interval_ns, transition_point,
+                      dpi=200 if args.publication else 80, verbose=args.verbose, out_path=args.save)
\ No newline at end of file
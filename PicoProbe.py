@@ -1,22 +1,53 @@
 # Copyright (C) 2018-2022 Pico Technology Ltd. See LICENSE file for terms.
 # PicoScope 5000 Series (A API) Data Streaming tool by MJ
 
-import ctypes, time, os, datetime, queue, multiprocessing, logging, signal
+import ctypes, time, os, io, json, types, datetime, queue, multiprocessing, logging, logging.handlers, signal, dataclasses, functools
 from picosdk.ps5000a import ps5000a as ps
 from picosdk.functions import assert_pico_ok
 import numpy as np
 
 # Set up logging to display information, warnings, and errors
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+batch_log = logging.getLogger('batches')  # One record per transferred batch, also written to batches.jsonl (see start_batch_log)
 
 # Global variables
 status = {}  # Dictionary to store the status of various operations
 chandle = ctypes.c_int16()  # Handle for the PicoScope device
-BUFFER_SIZE = 100000000  # Size of the buffer for storing samples
+# Size of the driver buffer per channel. It only has to hold the samples that arrive between two polls of the main loop:
+# the callback copies them into the ring straight away, so a small buffer (2 MB) stays cache-resident
+BUFFER_SIZE = 1 << 20
+TRANSFER_SIZE = 10000000  # Number of samples per channel handed to the save process in one batch (at most)
+MIN_TRANSFER_SIZE = TRANSFER_SIZE // 20  # Batch size main_loop starts with (and the smallest it accepts); it grows up to TRANSFER_SIZE
+# Ring buffer size: a power of two (so indices wrap with a mask) that holds a full driver buffer on top of a pending batch
+RING_SIZE = 1 << (BUFFER_SIZE + TRANSFER_SIZE - 1).bit_length()
+RING_MASK = RING_SIZE - 1
+NUM_SLOTS = 8  # Number of batch slots in the memory shared with the save process
+MONITOR_PERIOD = 0.05  # Seconds between two checks of the batch ring's fill level by main_loop
 select_channels = []  # List to store selected channels
 channel_range = ps.PS5000A_RANGE['PS5000A_2V']  # Default voltage range
 channel_range_list = ['10mV', '20mV', '50mV', '100mV', '200mV', '500mV', '1V', '2V', '5V', '10V', '20V']  # Available voltage ranges
 
+# Read-only tables mapping channel names and voltage range strings to PicoScope constants, built once at import
+CHANNEL_MAP = types.MappingProxyType({
+    'A': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_A'],
+    'B': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_B'],
+    'C': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_C'],
+    'D': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_D']
+})
+RANGE_MAP = types.MappingProxyType({
+    '10mV': ps.PS5000A_RANGE['PS5000A_10MV'],
+    '20mV': ps.PS5000A_RANGE['PS5000A_20MV'],
+    '50mV': ps.PS5000A_RANGE['PS5000A_50MV'],
+    '100mV': ps.PS5000A_RANGE['PS5000A_100MV'],
+    '200mV': ps.PS5000A_RANGE['PS5000A_200MV'],
+    '500mV': ps.PS5000A_RANGE['PS5000A_500MV'],
+    '1V': ps.PS5000A_RANGE['PS5000A_1V'],
+    '2V': ps.PS5000A_RANGE['PS5000A_2V'],
+    '5V': ps.PS5000A_RANGE['PS5000A_5V'],
+    '10V': ps.PS5000A_RANGE['PS5000A_10V'],
+    '20V': ps.PS5000A_RANGE['PS5000A_20V'],
+})
+
 def get_user_settings():
     """
     Interactively prompts the user to configure the data acquisition settings.
@@ -205,9 +236,9 @@ def setup_channels(selected_channels, voltage_ranges):
     This function performs the following tasks:
 
     1. Channel and Range Mapping:
-        - Initializes two dictionaries:
-            - `channel_mapping`: Maps user-friendly channel names ('A', 'B', 'C', 'D') to their corresponding PicoScope library constants.
-            - `range_mapping`: Maps user-friendly voltage range strings (e.g., '1V') to their corresponding PicoScope library constants.
+        - Uses the two read-only module-level tables:
+            - `CHANNEL_MAP`: Maps user-friendly channel names ('A', 'B', 'C', 'D') to their corresponding PicoScope library constants.
+            - `RANGE_MAP`: Maps user-friendly voltage range strings (e.g., '1V') to their corresponding PicoScope library constants.
 
     2. Channel Configuration:
         - Iterates over ALL possible channels ('A', 'B', 'C', 'D'):
@@ -220,7 +251,7 @@ def setup_channels(selected_channels, voltage_ranges):
                 - Uses a default voltage range of 2V. 
         - Calls the `ps.ps5000aSetChannel` function from the PicoScope library to configure each channel:
             - `chandle`: Device handle obtained from the `open_device` function.
-            - `channel_mapping[channel]`: The correct channel identifier for the PicoScope library.
+            - `CHANNEL_MAP[channel]`: The correct channel identifier for the PicoScope library.
             - `enabled`: Whether the channel is enabled (1) or disabled (0).
             - `ps.PS5000A_COUPLING['PS5000A_DC']`: Sets the coupling type to DC (direct current).
             - `channel_range`: The appropriate voltage range for the channel.
@@ -239,34 +270,12 @@ def setup_channels(selected_channels, voltage_ranges):
         Exception: If there is an error setting up any of the selected channels.
     """
 
-    # Create dictionaries to map channel names and voltage ranges to PicoScope constants
-    channel_mapping = {
-        'A': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_A'],
-        'B': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_B'],
-        'C': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_C'],
-        'D': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_D']
-    }
-
-    range_mapping = {
-        '10mV': ps.PS5000A_RANGE['PS5000A_10MV'],
-        '20mV': ps.PS5000A_RANGE['PS5000A_20MV'],
-        '50mV': ps.PS5000A_RANGE['PS5000A_50MV'],
-        '100mV': ps.PS5000A_RANGE['PS5000A_100MV'],
-        '200mV': ps.PS5000A_RANGE['PS5000A_200MV'],
-        '500mV': ps.PS5000A_RANGE['PS5000A_500MV'],
-        '1V': ps.PS5000A_RANGE['PS5000A_1V'],
-        '2V': ps.PS5000A_RANGE['PS5000A_2V'],
-        '5V': ps.PS5000A_RANGE['PS5000A_5V'],
-        '10V': ps.PS5000A_RANGE['PS5000A_10V'],
-        '20V': ps.PS5000A_RANGE['PS5000A_20V'],
-        }
-
     # Configure each channel
     for channel in 'ABCD':  # Iterate through all possible channels
         enabled = 1 if channel in selected_channels else 0  # Enable if selected, disable if not
-        channel_range = range_mapping[voltage_ranges[channel]] if channel in selected_channels else ps.PS5000A_RANGE['PS5000A_2V'] # Set range if selected, use default 2V if not
+        channel_range = RANGE_MAP[voltage_ranges[channel]] if channel in selected_channels else ps.PS5000A_RANGE['PS5000A_2V'] # Set range if selected, use default 2V if not
         status[f"setCh{channel}"] = ps.ps5000aSetChannel(chandle,
-                                                        channel_mapping[channel],
+                                                        CHANNEL_MAP[channel],
                                                         enabled,
                                                         ps.PS5000A_COUPLING['PS5000A_DC'],
                                                         channel_range,
@@ -284,12 +293,16 @@ def set_buffers(selected_channels):
     the incoming data from the selected channels. Here's how it works:
 
     1. Global Buffer Initialization:
-        - Declares `bufferMax` as a global variable. This dictionary will store the maximum buffer size for each selected channel.
-        - Initializes `bufferMax` as a dictionary where the keys are the selected channel names ('A', 'B', 'C', 'D')
-            and the values are NumPy arrays filled with zeros. These arrays will act as the buffers to hold the data.
+        - Declares `bufferMax` as a global variable. This 2-D array will hold the buffer of every selected channel.
+        - Initializes `bufferMax` as one NumPy array of shape (number of selected channels, `BUFFER_SIZE`) filled with zeros.
+            Row `i` is the buffer of `selected_channels[i]`, the same order as the rows of the ring buffer and of the
+            batch slots, so the samples of all channels can be moved with a single NumPy copy instead of one per channel.
+        - Declares `buffer_pointers` as a global dictionary holding, for each selected channel, the ctypes pointer to
+            the start of its `bufferMax` row. Each pointer is created once here and reused wherever the buffer has to be
+            passed to the PicoScope library, instead of calling `.ctypes.data_as` (which creates a new pointer object) every time.
 
     2. Channel Mapping:
-        - Creates a dictionary `channel_mapping` that maps human-readable channel names (e.g., 'A') to the 
+        - Uses the module-level `CHANNEL_MAP` that maps human-readable channel names (e.g., 'A') to the 
             corresponding PicoScope channel constants (e.g., `ps.PS5000A_CHANNEL['PS5000A_CHANNEL_A']`). 
             This makes the code easier to read and understand.
 
@@ -298,8 +311,8 @@ def set_buffers(selected_channels):
         - For each channel:
             - Calls the `ps.ps5000aSetDataBuffers` function from the PicoScope library to allocate memory for the data buffer.
                 - `chandle`: The device handle (from `open_device`) to communicate with the PicoScope.
-                - `channel_mapping[channel]`: The correct channel identifier for the PicoScope.
-                - `bufferMax[channel].ctypes.data_as(ctypes.POINTER(ctypes.c_int16))`: A pointer to the start of the NumPy buffer array.
+                - `CHANNEL_MAP[channel]`: The correct channel identifier for the PicoScope.
+                - `buffer_pointers[channel]`: The cached pointer to the start of the channel's row of `bufferMax`.
                 - `None`: No downsampling is being applied in this case.
                 - `BUFFER_SIZE`: The maximum size of the buffer (how many data points it can store).
                 - `0`: A parameter related to segmenting data (not used here, so set to 0).
@@ -317,25 +330,18 @@ def set_buffers(selected_channels):
         Exception: If there is an error setting up the data buffers for any of the selected channels.
     """
     
-    global bufferMax  # Make bufferMax global so it can be used elsewhere in the code
+    global bufferMax, buffer_pointers  # Make bufferMax and buffer_pointers global so they can be used elsewhere in the code
 
-    # Initialize a dictionary to store the data buffers for each selected channel
-    bufferMax = {ch: np.zeros(BUFFER_SIZE, dtype=np.int16) for ch in selected_channels}
-
-    # Mapping of channel names to PicoScope channel constants
-    channel_mapping = {
-        'A': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_A'],
-        'B': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_B'],
-        'C': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_C'],
-        'D': ps.PS5000A_CHANNEL['PS5000A_CHANNEL_D']
-    }
+    # Initialize one 2-D array holding the data buffer of each selected channel (one row per channel)
+    bufferMax = np.zeros((len(selected_channels), BUFFER_SIZE), dtype=np.int16)
+    buffer_pointers = {ch: bufferMax[i].ctypes.data_as(ctypes.POINTER(ctypes.c_int16)) for i, ch in enumerate(selected_channels)}
 
     # Set up data buffers for each selected channel
     for channel in selected_channels:
         status[f"setDataBuffers{channel}"] = ps.ps5000aSetDataBuffers(
             chandle,                                   # Device handle
-            channel_mapping[channel],                  # Channel identifier
-            bufferMax[channel].ctypes.data_as(ctypes.POINTER(ctypes.c_int16)),  # Pointer to the buffer
+            CHANNEL_MAP[channel],                      # Channel identifier
+            buffer_pointers[channel],                  # Pointer to the buffer
             None,                                      # No downsampling
             BUFFER_SIZE,                               # Buffer size
             0,                                         # Segment index (not used here)
@@ -346,6 +352,135 @@ def set_buffers(selected_channels):
     logging.info("Buffers set successfully")  # Log success message
 
 
+def channel_scales(selected_channels, voltage_ranges, resolution):
+    """
+    Computes the factor that converts the raw ADC counts of each selected channel into millivolts.
+
+    The samples are saved as raw int16 ADC counts, which is half the size of float32 millivolts and keeps the
+    save process limited by the disk rather than by a conversion. Instead, the conversion factor of every channel
+    is computed once here, so the whole recording can later be converted with a single NumPy multiply
+    (`mV = np.multiply(adc, scale, dtype=np.float32)`) rather than a per-sample loop such as `picosdk.functions.adc2mV`.
+
+    This function performs the following steps:
+
+    1. Maximum ADC Value:
+        - Calls `ps.ps5000aMaximumValue` to get the ADC count that corresponds to the full scale of the range.
+            This value depends on the resolution the device was opened with.
+        - At 8-bit resolution the samples are saved as int8 (see `save_data_worker`), one count of which is
+            256 int16 counts, so the maximum value is divided by 256 to match the saved data.
+
+    2. Scale Calculation:
+        - For each selected channel, converts its voltage range string (e.g., '500mV', '2V') to millivolts
+            and divides it by the maximum ADC value, giving the millivolts per ADC count as a `np.float32`.
+
+    Args:
+        selected_channels (list): A list of strings representing the channels the user wants to record from (e.g., ['A', 'C']).
+        voltage_ranges (dict): A dictionary mapping channel names to their corresponding voltage range strings (e.g., {'A': '1V', 'C': '5V'}).
+        resolution (int): The resolution the device was opened with (8 or 12).
+
+    Returns:
+        dict: The millivolts per ADC count of each selected channel (e.g., {'A': 0.0307, 'C': 0.1538}).
+
+    Raises:
+        Exception: If the maximum ADC value cannot be read from the device.
+    """
+    maxADC = ctypes.c_int16()
+    status["maximumValue"] = ps.ps5000aMaximumValue(chandle, ctypes.byref(maxADC))
+    assert_pico_ok(status["maximumValue"])  # Check if reading the maximum ADC value was successful
+    full_scale = maxADC.value / 256 if resolution == 8 else maxADC.value  # In saved counts (int8 at 8-bit)
+
+    scales = {}
+    for channel in selected_channels:
+        range_text = voltage_ranges[channel]
+        range_mV = float(range_text[:-2]) if range_text.endswith('mV') else float(range_text[:-1]) * 1000  # e.g. '2V' -> 2000.0
+        scales[channel] = np.float32(range_mV / full_scale)
+    return scales
+
+
+def save_scales(output_folder, scales, voltage_ranges):
+    """
+    Writes the conversion factors from `channel_scales` to `scales.json` in the output folder.
+
+    The file sits next to the channel folders and records, for each channel, its voltage range and the millivolts
+    per ADC count, so any `.npy` file of the recording can be converted with
+    `np.load(path) * scales[channel]['mv_per_count']`.
+
+    Args:
+        output_folder (str): The folder where the data files are saved.
+        scales (dict): The millivolts per ADC count of each channel, as returned by `channel_scales`.
+        voltage_ranges (dict): A dictionary mapping channel names to their corresponding voltage range strings.
+    """
+    with open(os.path.join(output_folder, 'scales.json'), 'w') as f:
+        json.dump({channel: {'voltage_range': voltage_ranges[channel], 'mv_per_count': float(scale)}
+                   for channel, scale in scales.items()}, f, indent=4)
+    logging.info(f"Conversion factors saved to {os.path.join(output_folder, 'scales.json')}")
+
+
+def start_log_listener():
+    """
+    Moves the console output of all logging calls to a background thread.
+
+    The handlers set up by `logging.basicConfig` are taken off the root logger and replaced with a single
+    `logging.handlers.QueueHandler`, which only puts each record on `log_queue`. A `QueueListener` thread takes the
+    records off the queue and passes them to the original handlers, so formatting and writing to the console happen
+    off the acquisition loop and a slow terminal never delays it.
+
+    `log_queue` is a `multiprocessing.Queue`, so the save process can send its records to the same listener
+    (see `save_data_worker`) and the messages of both processes keep one order on the console.
+
+    Returns:
+        tuple: The running `QueueListener` (call its `stop()` method before exiting, to write the remaining records)
+            and the `log_queue`.
+    """
+    root = logging.getLogger()
+    log_queue = multiprocessing.Queue()
+    listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    return listener, log_queue
+
+
+class BatchLogFormatter(logging.Formatter):
+    """
+    Formats the records of `batch_log` as one JSON object per line, with the fields `main_loop` passes in `extra`.
+
+    Fields missing from a record are written as null, so every line has the same keys.
+    """
+    FIELDS = ('ts', 'batch', 'samples', 'queue_depth', 'fill_ratio', 'dropped_batches', 'dropped_samples')
+
+    def format(self, record):
+        return json.dumps({field: getattr(record, field, None) for field in self.FIELDS})
+
+
+def start_batch_log(output_folder):
+    """
+    Starts writing the per-batch records of `main_loop` to `batches.jsonl` in the output folder.
+
+    The records are metrics for tuning the transfer size afterwards: each line holds the monotonic time (`ts`),
+    the batch number (the same as in `batches.idx`), its samples per channel, the number of batches waiting
+    to be saved (`queue_depth`), the fill ratio of the batch ring when the transfer was made, and the
+    number of batches and samples per channel dropped so far. Read the file with e.g. `pandas.read_json(path, lines=True)`.
+
+    The file is not written by `main_loop` itself: a `logging.handlers.QueueHandler` on `batch_log` only puts each
+    record on a queue, and a `QueueListener` thread formats it and writes it to disk, so disk writes never delay
+    the acquisition loop. The records also still reach the console through the root logger.
+
+    Args:
+        output_folder (str): The folder where the data files are saved.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener; call its `stop()` method at the end of the recording
+            to write the remaining records and close the file.
+    """
+    file_handler = logging.FileHandler(os.path.join(output_folder, 'batches.jsonl'))
+    file_handler.setFormatter(BatchLogFormatter())
+    records = queue.Queue()  # Unbounded, so the acquisition loop never waits to log
+    batch_log.addHandler(logging.handlers.QueueHandler(records))
+    listener = logging.handlers.QueueListener(records, file_handler)
+    listener.start()
+    return listener
+
+
 def run_streaming(sampling_rate):
     """
     Starts the PicoScope in continuous data streaming mode.
@@ -407,51 +542,143 @@ def run_streaming(sampling_rate):
     logging.info(f"Streaming started with sample interval: {sampleInterval.value} ns")
     
     
+def pin_to_core(env_var):
+    """
+    Pins the calling process to the CPU core given by an environment variable.
+
+    The acquisition process (`ACQ_CORE`) and the save process (`SAVER_CORE`) are both latency-sensitive. Pinning
+    each one to its own core (ideally one isolated with the `isolcpus=` kernel option) stops the scheduler from
+    migrating them between cores and keeps their caches warm.
+
+    Nothing is done if the variable is not set. CPU affinity is only available on Linux; on other platforms, or if
+    the core does not exist, a warning is logged and the process keeps its default affinity.
+
+    Args:
+        env_var (str): The name of the environment variable holding the core number (e.g., 'ACQ_CORE').
+
+    Example Usage:
+        ACQ_CORE=2 SAVER_CORE=3 python PicoProbe.py
+    """
+    core = os.environ.get(env_var)
+    if core is None:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        logging.warning(f"{env_var} is set, but CPU affinity is not supported on this platform")
+        return
+    try:
+        os.sched_setaffinity(0, {int(core)})
+    except (ValueError, OSError) as e:
+        logging.warning(f"Could not pin to CPU core {core!r} ({env_var}): {e}")
+        return
+    logging.info(f"Pinned to CPU core {core} ({env_var})")
+
+
+def raise_priority():
+    """
+    Raises the scheduling priority of the acquisition process when the `ACQ_REALTIME` environment variable is set.
+
+    It lowers the nice value to -10 and then switches the process to the real-time `SCHED_FIFO` policy, so the
+    loop that drains the PicoScope is not preempted by ordinary processes. Both steps need root privileges
+    (or CAP_SYS_NICE) and are only available on Linux; if either fails, a warning is logged and acquisition
+    continues at normal priority.
+    """
+    if not os.environ.get('ACQ_REALTIME'):
+        return
+    try:
+        os.nice(-10)
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(os.sched_get_priority_min(os.SCHED_FIFO)))
+        logging.info("Acquisition process running with SCHED_FIFO priority")
+    except (AttributeError, OSError) as e:
+        logging.warning(f"Could not raise the acquisition priority: {e}")
+
+
 # Global flag to indicate if the program should exit
 exit_event = multiprocessing.Event()
+# The same flag as a plain integer, set by the signal handler and read by the streaming callback and main_loop:
+# setting or reading it is a single store or load, with no lock, while `exit_event` takes the event's lock on every call
+exit_flag = multiprocessing.RawValue(ctypes.c_int32, 0)
 
 
 def signal_handler(signum, frame):
     """
     Gracefully handles interrupt signals (like Ctrl+C) to stop data collection.
 
-    This function is called when the user presses Ctrl+C (or sends a similar interrupt signal). It sets a global flag 
-    to signal that the data collection process should stop.
+    This function is called when the user presses Ctrl+C (or sends a similar interrupt signal). It only sets the global
+    `exit_flag` to signal that the data collection process should stop; `main_loop` checks the flag, logs the interrupt
+    and returns, and `__main__` then sets the `exit_event` to stop the save process.
+
+    The handler runs on the main thread between two bytecodes, possibly while that thread holds a lock: the lock of the
+    `exit_event` (e.g., inside `exit_event.wait`) or of the log queue (inside a `logging` call). Those locks are not
+    re-entrant, so setting the event or logging from here could wait forever for the interrupted code, and the device
+    would never be stopped. A single store into the shared `exit_flag` takes no lock.
 
     Args:
         signum (int): The signal number (not used in this function, but required for signal handlers).
         frame (frame object): The current stack frame (not used in this function, but required for signal handlers).
     """
-    exit_event.set()  # Set the exit_event flag to signal that the program should terminate
-    logging.info("Interrupt received, preparing to exit...")
+    exit_flag.value = 1  # Stops the streaming callback and main_loop; no lock is taken and nothing is logged here
 
 
 # Register the signal handler
 signal.signal(signal.SIGINT, signal_handler)
 
-def streaming_callback(handle, noOfSamples, startIndex, overflow, triggerAt, triggered, autoStop, param):
+@dataclasses.dataclass
+class StreamState:
+    """
+    The state of one streaming acquisition, shared by `main_loop` and the streaming callback.
+
+    `main_loop` creates one instance and passes it to `get_data`, and the callback receives it as its first argument
+    (bound with `functools.partial`), instead of both functions sharing module-level globals declared with `global`.
+    Each function reads the fields it uses into local variables once per call, so the hot paths work on fast locals.
+    Several acquisitions could also run in one process, each with its own state.
+
+    Attributes:
+        buffers (numpy.ndarray): The PicoScope's `bufferMax` (one row per selected channel), filled by the driver.
+        ring (numpy.ndarray): The fixed-size ring buffer (one row per selected channel) the callback copies the samples into.
+        write_head (int): The total number of samples the callback has written into the ring since streaming started.
+        overflow_events (int): The number of callbacks that reported an overflow.
+        overflow_mask (int): The `overflow` bit fields (one bit per channel) of those callbacks, ORed together.
+        callback: The ctypes function pointer to the callback, bound to this state, passed to `ps5000aGetStreamingLatestValues`.
+            It is kept here so it stays alive (and is not garbage collected) for as long as the state is in use.
+    """
+    buffers: np.ndarray
+    ring: np.ndarray
+    write_head: int = 0
+    overflow_events: int = 0
+    overflow_mask: int = 0
+    callback: object = None
+
+def streaming_callback(state, handle, noOfSamples, startIndex, overflow, triggerAt, triggered, autoStop, param):
     """
     Handles data streaming callbacks from the PicoScope.
 
     This function is called by the PicoScope library whenever a new batch of data is available. 
-    It does the following:
+    It works on the `StreamState` bound to it by `main_loop` and does the following:
 
     1. Check for Exit Signal:
-        - If the `exit_event` flag is set (e.g., by Ctrl+C), the function returns immediately to allow the main loop to exit.
+        - If the `exit_flag` is set (e.g., by Ctrl+C), the function returns immediately to allow the main loop to exit.
+            It is a plain shared integer, so the check is a single memory read rather than a locked `exit_event.is_set()` call.
 
     2. Overflow Handling:
-        - If an overflow occurred (meaning some data was lost), it logs a warning message indicating how many samples were lost.
+        - Counts the callbacks that report an overflow in `state.overflow_events` and ORs the `overflow` bit field (one bit per channel)
+            into `state.overflow_mask`. Both are a single arithmetic operation with no branch; `main_loop` logs them after the
+            callback has returned, so a slow `logging` call never runs while the driver is waiting on the callback.
 
     3. Data Transfer:
-        - Iterates over each of the `selected_channels`.
-        - Copies the new data samples from the PicoScope's `bufferMax` to the `bufferComplete` buffer for each channel.
-        - This is done to build up a complete buffer of data that can be processed later.
-
-    4. Update Sample Count:
-        - Increments the `nextSample` counter by the number of new samples received.
-        - This keeps track of how much data has been collected in total.
+        - Copies the new data samples of all channels at once from the PicoScope's buffers (`state.buffers`) into the fixed-size
+            ring buffer (`state.ring`), starting at `write_head & RING_MASK`. Both are 2-D arrays with one row per selected channel,
+            so this is a single `np.copyto` call, with no per-channel Python loop or dictionary lookups.
+            NumPy releases the GIL while it copies, so the copy does not block other Python threads.
+        - If the new samples run past the end of the ring, the copy is split in two: the first part fills the end
+            of the ring and the rest wraps around to its start.
+
+    4. Update Write Head:
+        - Increments `state.write_head` by the number of new samples received.
+        - `write_head` only ever grows; it is the total number of samples collected so far, and `main_loop`
+            compares it with its own read position to know how many samples are waiting in the ring.
 
     Args:
+        state (StreamState): The state of the acquisition, bound by `main_loop`.
         handle: The device handle (not used in this function).
         noOfSamples (int): The number of new samples received.
         startIndex (int): The starting index in the buffer where the new samples are located.
@@ -461,123 +688,385 @@ def streaming_callback(handle, noOfSamples, startIndex, overflow, triggerAt, tri
         autoStop (int): Not used in this function.
         param: Not used in this function.
     """
-    global bufferComplete, nextSample, selected_channels
-    if exit_event.is_set():
+    if exit_flag.value:
         return
-    if overflow:
-        logging.warning(f"Overflow occurred. Lost {noOfSamples} samples.")
-    for channel in selected_channels:
-        bufferComplete[channel][nextSample:nextSample + noOfSamples] = bufferMax[channel][startIndex:startIndex + noOfSamples]
-    nextSample += noOfSamples
+    state.overflow_events += overflow != 0  # Reported and reset by main_loop
+    state.overflow_mask |= overflow
+    ring, buffers, write_head = state.ring, state.buffers, state.write_head  # Local copies for the rest of the call
+    ring_index = write_head & RING_MASK  # Position in the ring where the new samples start
+    first_part = min(noOfSamples, RING_SIZE - ring_index)  # Samples that fit before the end of the ring
+    np.copyto(ring[:, ring_index:ring_index + first_part], buffers[:, startIndex:startIndex + first_part], casting='no')
+    if first_part < noOfSamples:  # Wrap around to the start of the ring
+        np.copyto(ring[:, :noOfSamples - first_part], buffers[:, startIndex + first_part:startIndex + noOfSamples], casting='no')
+    state.write_head = write_head + noOfSamples
+
+
+def get_data(state):
+    """
+    Retrieves the latest data from the PicoScope streaming buffer.
+
+    This function calls the `ps5000aGetStreamingLatestValues` function from the PicoScope library to fetch
+    the most recent data that has been streamed into the buffer, passing the callback bound to `state`.
+    It also returns the current value of `state.write_head`, which indicates how many samples have been collected so far.
 
+    Args:
+        state (StreamState): The state of the acquisition, created by `main_loop`.
 
-# Define a function pointer to the streaming callback function for the PicoScope library
-cFuncPtr = ps.StreamingReadyType(streaming_callback)
+    Returns:
+        int: The total number of samples written into the ring buffers since streaming started.
+    """
+    # Get the latest values from the streaming buffer
+    status["getStreamingLatestValues"] = ps.ps5000aGetStreamingLatestValues(chandle, state.callback, None)
+    return state.write_head
 
+class BatchRing:
+    """
+    A lock-free, single-producer single-consumer ring of batch slots in memory shared with the save process.
+
+    `main_loop` is the only producer and `save_data_worker` the only consumer, so handing a batch over needs no
+    lock, pipe or pickling: the producer fills slot `head % NUM_SLOTS` and then increments `head`, the consumer
+    saves slot `tail % NUM_SLOTS` and then increments `tail`. Each counter is written by one process only, and
+    `head - tail` is the number of batches waiting to be saved (the ring is full when it reaches `NUM_SLOTS`).
+
+    All the memory is `multiprocessing` shared ctypes memory, created once in the main process and handed to the
+    save process when it starts:
+        - `samples`: The int16 samples of all slots (see `slots`).
+        - `lengths`: The number of samples per channel in each slot.
+        - `starts`: The acquisition offset of each slot, the number of samples per channel acquired before its first
+            sample. It differs from the samples saved before it once batches have been dropped (see `main_loop`).
+        - `counters`: The `head` and `tail` counters as `c_uint64`, 64 bytes (one cache line) apart so that the two
+            processes never write to the same cache line.
+
+    A `multiprocessing.Semaphore`, `ready`, is released once per published batch and once more by `close`, so the
+    consumer sleeps in the kernel until there is something to save and wakes as soon as a batch is published, instead
+    of polling the counters. The semaphore is also what makes the hand-off safe on every CPU: releasing and acquiring
+    it are memory barriers, while plain loads and stores of the shared memory may be reordered (e.g., on the ARM
+    hosts PicoSDK supports). The consumer therefore counts the wake-ups it has acquired (`wakeups`, kept in the
+    consumer's own copy of the ring) and only reads a slot once it has acquired the wake-up of the batch in it, so
+    the batch's samples, length and offset are visible by then, whatever order `head` was seen in. Acquiring one
+    more wake-up than there are published batches means `close` was called.
+
+    `qsize()` is the difference of the two counters, read without a lock or a system call, so the fill level can be
+    checked as often as needed without slowing down the producer or the consumer. `maxsize` is the capacity
+    (`NUM_SLOTS`); together they are what `check_queue_size` reads.
 
-def get_data():
+    Args:
+        n_channels (int): The number of selected channels (rows per slot).
     """
-    Retrieves the latest data from the PicoScope streaming buffer.
+    HEAD = 0  # Index of the head counter in `counters`
+    TAIL = 8  # Index of the tail counter, one 64-byte cache line after the head
+
+    def __init__(self, n_channels):
+        self.n_channels = n_channels
+        self.maxsize = NUM_SLOTS
+        self.samples = multiprocessing.RawArray(ctypes.c_int16, NUM_SLOTS * n_channels * TRANSFER_SIZE)
+        self.lengths = multiprocessing.RawArray(ctypes.c_int64, NUM_SLOTS)
+        self.starts = multiprocessing.RawArray(ctypes.c_int64, NUM_SLOTS)
+        self.counters = multiprocessing.RawArray(ctypes.c_uint64, 2 * self.TAIL)
+        self.ready = multiprocessing.Semaphore(0)
+        self.wakeups = 0  # Consumer only: wake-ups acquired from `ready` so far
+
+    def slots(self):
+        """
+        Wraps the shared samples as a NumPy array of shape (NUM_SLOTS, n_channels, TRANSFER_SIZE).
+
+        Returns:
+            numpy.ndarray: An int16 view (no copy) of the shared memory. Each process calls this once for itself.
+        """
+        return np.frombuffer(self.samples, dtype=np.int16).reshape(NUM_SLOTS, self.n_channels, TRANSFER_SIZE)
+
+    def qsize(self):
+        """
+        Returns the number of batches waiting to be saved (published but not yet released), without taking a lock.
+        """
+        return self.counters[self.HEAD] - self.counters[self.TAIL]
+
+    def next_free_slot(self):
+        """
+        Producer: returns the index of the slot the next batch goes into, or None if every slot is still waiting to be saved.
+
+        It never waits: while the ring is full, `main_loop` keeps polling the PicoScope and decides what to do with the batch.
+        """
+        if self.qsize() >= self.maxsize:  # Every slot is still waiting to be saved
+            return None
+        return self.counters[self.HEAD] % NUM_SLOTS
+
+    def publish(self, n_samples, first_sample):
+        """
+        Producer: hands the slot returned by `next_free_slot`, now holding `n_samples` samples per channel, to the consumer.
+
+        `first_sample` is the acquisition offset of the batch (the samples per channel acquired before it).
+        """
+        head = self.counters[self.HEAD]
+        self.lengths[head % NUM_SLOTS] = n_samples
+        self.starts[head % NUM_SLOTS] = first_sample
+        self.counters[self.HEAD] = head + 1
+        self.ready.release()  # Wake the consumer; as a memory barrier, this also makes the slot visible to it
+
+    def get(self, timeout):
+        """
+        Consumer: returns the `(slot_index, n_samples, first_sample)` entries of all waiting batches, oldest first, without removing them.
+
+        Only batches whose wake-up has been acquired are returned (see the class docstring). Returns None once the ring
+        is closed and empty. Raises `queue.Empty` if no batch arrives within `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            while self.ready.acquire(block=False):  # Collect the wake-ups of batches already published
+                self.wakeups += 1
+            head, tail = self.counters[self.HEAD], self.counters[self.TAIL]
+            if min(self.wakeups, head) > tail:
+                break
+            if self.wakeups > head:  # The wake-up of `close` has been acquired, and every batch is saved
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.ready.acquire(timeout=remaining):  # Sleep until a batch is published
+                raise queue.Empty
+            self.wakeups += 1
+        slots = [(tail + i) % NUM_SLOTS for i in range(min(self.wakeups, head) - tail)]
+        return [(slot, self.lengths[slot], self.starts[slot]) for slot in slots]
+
+    def release(self, count):
+        """
+        Consumer: frees the oldest `count` slots returned by the last `get` once they have been saved.
+        """
+        self.counters[self.TAIL] += count
+
+    def close(self):
+        """
+        Producer: signals the consumer that no more batches will be published.
+        """
+        self.ready.release()  # One wake-up more than there are batches tells the consumer the ring is closed
+
+def npy_header(dtype, n_samples):
+    """
+    Builds the header of a `.npy` file holding a 1-D array of `n_samples` values of `dtype`.
 
-    This function calls the `ps5000aGetStreamingLatestValues` function from the PicoScope library to fetch
-    the most recent data that has been streamed into the buffer. It also returns the current value of 
-    the `nextSample` variable, which indicates how many samples have been collected so far.
+    The header is padded to 128 bytes whatever the number of samples, so `append_npy` can rewrite it in place
+    with the new length every time samples are appended, without moving the samples that follow it.
+
+    Args:
+        dtype (numpy.dtype): The data type of the samples (e.g., np.int16).
+        n_samples (int): The number of samples in the file.
 
     Returns:
-        int: The number of samples currently in the `bufferComplete` buffer.
+        bytes: The complete header (magic string, version and padded header dictionary).
     """
-    # Get the latest values from the streaming buffer
-    status["getStreamingLatestValues"] = ps.ps5000aGetStreamingLatestValues(chandle, cFuncPtr, None)
-    return nextSample
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                                  'fortran_order': False,
+                                                  'shape': (n_samples,)})
+    return header.getvalue()
 
-def save_data_worker(data_queue, output_folder, exit_event):
+def write_parts(fd, parts):
+    """
+    Writes a list of byte buffers to a file descriptor, at its current position, with as few system calls as possible.
+
+    All the buffers are written together with one `os.writev` call (one `os.write` per part where `writev`
+    is not available, e.g. on Windows), straight from their memory, so they are stored one after the other
+    without first being concatenated. The loop only repeats if the operating system writes less than requested.
+
+    Args:
+        fd (int): The file descriptor to write to.
+        parts (list): The `memoryview`s of bytes to write, in order.
+    """
+    parts = list(parts)
+    while parts:
+        written = os.writev(fd, parts) if hasattr(os, 'writev') else os.write(fd, parts[0])
+        while parts and written >= len(parts[0]):  # Drop the parts that were written completely
+            written -= len(parts[0])
+            parts.pop(0)
+        if parts:
+            parts[0] = parts[0][written:]  # Continue after a partial write
+
+def append_npy(fd, dtype, n_saved, arrays):
+    """
+    Appends samples to a growing 1-D `.npy` file and updates its header to the new length.
+
+    The samples are written after the first `n_saved` samples already in the file, then the header is rewritten
+    for the new total. Writing the samples first means the header never counts samples that are not yet on disk,
+    so the file can be loaded with `np.load` at any time, even if the program stops during a recording.
+    Writing at an explicit position (rather than at the end of the file) also means that a failed append is
+    simply overwritten by the next one.
+
+    The samples written by earlier appends are never read back by this program, so the operating system is asked to
+    drop them from its page cache (`os.posix_fadvise` with `POSIX_FADV_DONTNEED`, where available; not on Windows).
+    A long recording otherwise fills the cache with sample data and pushes out the pages of running programs.
+    Pages of the latest append are kept until the next one, giving the kernel time to write them to disk first,
+    since pages that are still waiting to be written are not dropped.
+
+    Args:
+        fd (int): The file descriptor of the `.npy` file, opened for writing.
+        dtype (numpy.dtype): The data type of the samples (e.g., np.int16).
+        n_saved (int): The number of samples already in the file.
+        arrays (list): The arrays of samples to append, in order; each must be C-contiguous (e.g., a row of a batch slot).
+
+    Returns:
+        int: The number of samples in the file after the append.
+    """
+    n_total = n_saved + sum(len(data) for data in arrays)
+    header = npy_header(dtype, n_total)
+    data_start = len(header) + n_saved * np.dtype(dtype).itemsize  # Byte offset of the new samples
+    os.lseek(fd, data_start, os.SEEK_SET)
+    write_parts(fd, [memoryview(data).cast('B') for data in arrays])
+    os.lseek(fd, 0, os.SEEK_SET)
+    write_parts(fd, [memoryview(header)])
+    if hasattr(os, 'posix_fadvise') and data_start > len(header):
+        os.posix_fadvise(fd, len(header), data_start - len(header), os.POSIX_FADV_DONTNEED)  # Drop the earlier samples from the cache
+    return n_total
+
+def save_data_worker(batch_ring, selected_channels, output_folder, resolution, log_queue=None):
     """
     This function runs as a separate process to save data received from the main data collection process.
 
-    It continuously monitors a queue for incoming data, processes each batch, 
-    and saves the data to files. It also includes a mechanism to periodically check 
-    the queue size and warn if it's filling up, which could indicate a problem.
+    It continuously monitors the batch ring for incoming batches, appends all waiting batches from the shared memory 
+    to one file per channel and hands the slots back to the main process. It also includes a mechanism to periodically check 
+    the ring's fill level and warn if it's filling up, which could indicate a problem.
 
     Args:
-        data_queue (multiprocessing.Queue): The queue from which the worker retrieves data to save.
+        batch_ring (BatchRing): The shared ring from which the worker retrieves `(slot_index, n_samples, first_sample)` entries
+            and to which it returns the slots once they are saved.
+        selected_channels (list): The selected channels, in the order of the rows of each slot (e.g., ['A', 'C']).
         output_folder (str): The folder where the data files will be saved.
-        exit_event (multiprocessing.Event): An event object that signals when the worker should stop.
+        resolution (int): The resolution the device was opened with (8 or 12).
+        log_queue (multiprocessing.Queue, optional): The queue of the main process's log listener (see `start_log_listener`).
+            If given, the worker's log records are sent to it instead of being written to the console by the worker itself.
 
     Steps:
 
     1. Initialization:
         - data_counter: Initializes a counter to track the number of data batches saved.
+        - log_batches: Whether a message is logged for every saved batch (only if the INFO level is enabled).
+        - n_saved: Initializes the number of samples per channel saved so far.
+        - data_files: Creates one `.npy` file per channel, `channel_<x>.npy` in the output folder, holding an empty array.
+            All the samples of the channel are appended to this file, instead of writing a separate file per batch,
+            so the whole recording can be read with one `np.load(path, mmap_mode='r')`.
+        - index_file: Creates `batches.idx` in the output folder, an append-only log with one
+            `(batch_number, first_sample, n_samples, acquired_sample)` row of int64 values for each saved batch
+            (read it with `np.fromfile(path, dtype=np.int64).reshape(-1, 4)`). `first_sample` is where the batch starts
+            in the channel files and `acquired_sample` where it starts in the acquisition. They only differ after batches
+            were dropped because saving fell behind: a jump in `acquired_sample - first_sample` between two rows marks a gap
+            of that many samples in the recording, just before the second batch.
+        - save_dtype: The data type written to disk. At 8-bit resolution the driver returns each 8-bit sample
+            in the upper byte of an int16 (the lower byte is always 0), so only that byte is kept and the samples
+            are saved as int8, halving the bytes written with no loss. At 12-bit resolution they are saved as int16.
         - last_queue_check_time: Stores the time of the last queue size check.
         - queue_check_interval: Sets the time interval (in seconds) between queue size checks (default is 5 seconds).
 
     2. Main Loop:
-        - The loop continues running until the `exit_event` is set (usually triggered by Ctrl+C or another signal).
-        - It tries to get a batch of channel data from the `data_queue`.
+        - The loop continues running until the main process closes the `batch_ring` and every batch published before
+            that has been saved. It does not watch the `exit_event`: the main process sets that event before closing the ring,
+            and stopping on it would abandon the batches still waiting in the ring at every shutdown.
+        - It tries to get the slot indices of the waiting batches from the `batch_ring`.
 
     3. Data Retrieval:
-        - data_queue.get(timeout=0.1): Attempts to retrieve data from the queue with a 0.1 second timeout. 
+        - batch_ring.get(timeout=0.1): Attempts to retrieve the `(slot_index, n_samples, first_sample)` entries of every batch waiting in the ring with a 0.1 second timeout. 
+            - The worker sleeps until a batch is published and wakes immediately when one is; the timeout only bounds how long a single wait lasts.
+            - Normally this is a single batch. If saving has fallen behind, several batches are waiting and they are all
+                saved together (see below), so the worker catches up with fewer system calls.
             - If no data is available within the timeout, it continues to the next iteration.
-            - If `None` is received, it means the main process has sent a signal to terminate, so the loop breaks.
+            - If `None` is received, it means the main process has closed the ring and every batch has been saved, so the loop breaks.
+                `get` only returns None once the ring is empty, so the batches still waiting when the ring is closed are saved first.
 
     4. Data Saving (if data is available):
-        - Logs a message indicating that a data batch is being processed.
-        - Iterates over each channel in the `channel_data` dictionary:
-            - Creates a folder for the channel if it doesn't exist.
-            - Constructs the file path where the data will be saved.
-            - Uses `np.save` to save the data array to a `.npy` file (NumPy's binary format).
-            - Logs a message indicating that the data was saved, along with the channel name and the number of samples.
+        - Adds up `n_samples`, the total number of samples per channel in the retrieved batches.
+        - Iterates over each of the `selected_channels` (row `i` of a slot holds the samples of channel `i`):
+            - Collects the channel's row of every retrieved slot, in order.
+                At 8-bit resolution, each row is first shifted right by 8 bits into its slot's row of the reusable int8 `packed` buffer.
+            - Uses `append_npy` to append all the rows, read directly from memory, to the channel's `.npy` file (NumPy's binary format)
+                in a single `writev` call, after the `n_saved` samples already saved, and to update the file's header.
+        - Appends a row per retrieved batch to the `index_file`.
+        - Logs one message indicating that the data was saved, along with the channel names and the number of samples.
+            Whether INFO messages are logged at all is checked once, in `log_batches`, when the worker starts; if they are
+            not, no message is formatted and the logging lock is never taken for the batches.
+        - Calls `batch_ring.release()` for the retrieved slots (even if saving failed) so the main process can reuse them.
 
     5. Data Counter Update:
-        - Increments the `data_counter` after saving a batch.
+        - Increments the `data_counter` by the number of saved batches and `n_saved` by `n_samples`.
+            If saving failed, they are left unchanged, so the next batches overwrite the failed ones in every channel file.
 
     6. Queue Size Check:
-        - Periodically checks the size of the data_queue to see if it's getting too large.
+        - Periodically checks the number of batches waiting in the batch_ring to see if it's getting too large.
         - If the time since the last check exceeds the `queue_check_interval`, it calls the `check_queue_size` function (defined elsewhere) to log a warning if necessary.
         - Updates the `last_queue_check_time` to the current time.
 
     7. Exception Handling:
         - queue.Empty: If the queue is empty (within the timeout), the loop continues to the next iteration.
-        - Exception: Any other errors are logged, but only if the `exit_event` is not set (to avoid logging errors during shutdown).
+        - Exception: Any other errors are logged, including during shutdown, since the worker is then still saving batches.
 
     8. Termination:
-        - After the loop ends (due to the exit event or an error), a final log message indicates that the worker has finished.
+        - After the loop ends (once the ring is closed and drained), the channel files and the index file are closed
+            and a final log message indicates that the worker has finished.
+
+    Before anything else, the worker routes its logging to the `log_queue` (if given) and pins itself to the core given by
+    the `SAVER_CORE` environment variable (see `pin_to_core`).
     """
+    if log_queue is not None:
+        logging.getLogger().handlers = [logging.handlers.QueueHandler(log_queue)]  # Log through the main process's listener
+    pin_to_core('SAVER_CORE')
+
     data_counter = 0
-    last_queue_check_time = time.time()
+    n_saved = 0
+    log_batches = logging.getLogger().isEnabledFor(logging.INFO)
+    channel_names = ', '.join(selected_channels)
+    last_queue_check_time = time.monotonic()
     queue_check_interval = 5  # Check queue size every 5 seconds
-
-    while not exit_event.is_set():
+    batches = batch_ring.slots()
+    save_dtype = np.int8 if resolution == 8 else np.int16
+    packed = np.empty((NUM_SLOTS, TRANSFER_SIZE), dtype=np.int8) if resolution == 8 else None  # Reused for every 8-bit batch
+
+    # One growing .npy file per channel, starting as an empty array, and the batch index
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    data_files = [os.open(os.path.join(output_folder, f"channel_{channel.lower()}.npy"), flags) for channel in selected_channels]
+    for fd in data_files:
+        append_npy(fd, save_dtype, 0, [])
+    index_file = os.open(os.path.join(output_folder, 'batches.idx'), flags | os.O_APPEND)
+
+    while True:
         try:
-            channel_data = data_queue.get(timeout=0.1)
-            if channel_data is None:  # Check for termination signal
+            entries = batch_ring.get(timeout=0.1)
+            if entries is None:  # Check for termination signal
                 break
-
-            for channel, data in channel_data.items():
-                channel_folder = os.path.join(output_folder, f"channel_{channel.lower()}")
-                os.makedirs(channel_folder, exist_ok=True)
-
-                file_path = os.path.join(channel_folder, f'data_{data_counter}.npy')
-                np.save(file_path, data)
-
-                logging.info(f"Data {data_counter} saved for channel {channel}, Sample #: {len(data)}")
-
-            data_counter += 1
+            n_samples = sum(n for _, n, _ in entries)  # Samples per channel in all the waiting batches
+
+            try:
+                for i in range(len(selected_channels)):
+                    rows = [batches[slot, i, :n] for slot, n, _ in entries]
+                    if packed is not None:  # 8-bit: keep the upper byte, where the driver puts the sample
+                        rows = [np.right_shift(row, 8, out=packed[slot, :len(row)], casting='unsafe')
+                                for (slot, _, _), row in zip(entries, rows)]
+                    append_npy(data_files[i], save_dtype, n_saved, rows)
+
+                # Record where each batch starts in the channel files and in the acquisition
+                lengths = [n for _, n, _ in entries]
+                index = np.column_stack([data_counter + np.arange(len(entries)), n_saved + np.cumsum([0] + lengths[:-1]), lengths,
+                                         [start for _, _, start in entries]])
+                os.write(index_file, index.astype(np.int64).tobytes())
+
+                if log_batches:
+                    logging.info("Data %d saved for channels %s, Sample #: %d", data_counter, channel_names, n_samples)
+            finally:
+                batch_ring.release(len(entries))  # Hand the slots back to the main process
+
+            data_counter += len(entries)
+            n_saved += n_samples
 
             # Check queue size periodically
-            current_time = time.time()
+            current_time = time.monotonic()
             if current_time - last_queue_check_time >= queue_check_interval:
-                check_queue_size(data_queue)
+                check_queue_size(batch_ring)
                 last_queue_check_time = current_time
 
         except queue.Empty:
             continue
         except Exception as e:
-            if not exit_event.is_set():
-                logging.error(f"Error in save_data_worker: {e}")
+            logging.error(f"Error in save_data_worker: {e}")
+    for fd in data_files + [index_file]:
+        os.close(fd)
     logging.info("Save data worker finished")
 
 
-def main_loop(selected_channels, data_queue, duration, exit_event):
+def main_loop(selected_channels, batch_ring, duration, exit_event, transfer_size=MIN_TRANSFER_SIZE):
     """
     This function is the core of the data collection process. 
 
@@ -588,86 +1077,209 @@ def main_loop(selected_channels, data_queue, duration, exit_event):
 
     Args:
         selected_channels (list): A list of strings representing the active channels (e.g., ['A', 'C']).
-        data_queue (multiprocessing.Queue): A queue used to transfer data to the save_data_worker process.
+        batch_ring (BatchRing): The shared ring used to pass batches to the save_data_worker process.
         duration (int or None): The duration of data collection in seconds (or None for manual termination).
         exit_event (multiprocessing.Event): An event object used to signal the loop to stop.
+        transfer_size (int, optional): The initial batch size in samples per channel (default: `MIN_TRANSFER_SIZE`).
+            It is kept between `MIN_TRANSFER_SIZE` and `TRANSFER_SIZE`, the largest a slot can hold.
 
     Steps:
 
-    1. Global Variable Initialization:
-        - Declares `nextSample` and `bufferComplete` as global variables.
-        - Initializes `bufferComplete` as a dictionary where the keys are the selected channel names 
-            and the values are NumPy arrays of zeros. These arrays will act as buffers to temporarily store incoming data.
-        - Sets `nextSample` to 0, which tracks the next available index in the buffers.
+    1. Stream State Initialization:
+        - Creates `state`, the `StreamState` of this acquisition, shared with the streaming callback (no global variables):
+            - `state.ring` is a NumPy array of shape (number of selected channels, `RING_SIZE`), one circular buffer
+                per row in the order of `selected_channels`. The streaming callback writes into these circular buffers.
+            - `state.buffers` is the PicoScope's `bufferMax`, set up by `set_buffers`.
+            - `state.write_head` (samples written by the callback) and the overflow counters start at 0.
+            - `state.callback` is the ctypes function pointer to `streaming_callback` with `state` bound as its first argument.
+        - Sets `read_head` (samples already sent for saving) to 0. `write_head` and `read_head` only ever grow;
+            `write_head - read_head` is the number of samples waiting in the ring.
+        - Sets `overflows_reported`, the number of overflow events already logged, to 0, and `batch_number`,
+            the number of batches transferred so far, to 0.
+        - Sets `dropped_batches` and `dropped_samples`, the batches (and their samples per channel) dropped because
+            the save process fell behind, and `drops_reported`, the number of dropped batches already logged, to 0.
+            `last_drop_report` is the time of the last report.
+        - Sets `last_monitor`, the time of the last fill level check of the `batch_ring`, to the start of the loop,
+            and `last_samples`, the `write_head` after the previous poll, to 0.
 
     2. Transfer Size:
-        - Calculates the `transfer_size` as 10% of the `BUFFER_SIZE`. 
-            This determines how much data is accumulated in the buffers before being sent to the worker process for saving.
-
-    3. Start Time:
-        - Records the `start_time` to track the elapsed time during data collection.
+        - Starts with `transfer_size` (by default `MIN_TRANSFER_SIZE`, 500,000 samples) as the batch size. 
+            This determines how much data is accumulated in the ring before being sent to the worker process for saving.
+            Starting small means the first batches reach the save process (and the disk) early in the recording.
+        - The batch size adapts to the fill level of the `batch_ring` at every transfer:
+            - Below 30% full, the save process is keeping up, so the batch size grows by 25% (up to `TRANSFER_SIZE`):
+                fewer, larger batches cost less per sample.
+            - Otherwise it is left unchanged. It is never reduced when the save process falls behind: the ring holds a
+                fixed number of batches (`NUM_SLOTS`), so it can only buffer `NUM_SLOTS * transfer_size` samples, and
+                smaller batches would cut that headroom exactly when it is needed, making dropped batches more likely.
+                Nor would they be saved faster, since the save process already writes all waiting batches with one
+                `writev` per channel.
+            - Every change is logged, so the sizes chosen during a recording can be reviewed afterwards.
+
+    3. Deadline:
+        - If a duration was specified, computes the `deadline`, `time.monotonic()` plus the duration, once before the loop
+            (None for manual termination). The monotonic clock cannot jump when the system clock is adjusted (e.g., by NTP),
+            so the recording always lasts the requested duration, and each check is a single comparison.
 
     4. Main Loop:
-        - The loop continues running until the `exit_event` is set (e.g., by Ctrl+C or another signal).
-        - Calls the `get_data` function to retrieve the latest data from the PicoScope streaming buffer.
-        - If the `nextSample` counter reaches or exceeds the `transfer_size`, it means the buffers are ready to be transferred:
-            - Creates a new dictionary `data_to_save` containing copies of the filled portions of the buffers.
-            - Puts this `data_to_save` dictionary into the `data_queue`, signaling the worker process to save it.
-            - Logs a message indicating that data has been put into the queue.
-            - Resets the `bufferComplete` buffers and the `nextSample` counter for the next batch of data.
-        - Checks if a duration was specified and if that duration has been reached:
+        - The loop continues running until the `exit_flag` (set by Ctrl+C or another signal, see `signal_handler`)
+            or the `exit_event` is set.
+        - Calls the `get_data` function with `state` to retrieve the latest data from the PicoScope streaming buffer.
+        - If the callback counted new overflow events, logs one warning with their number and the channels
+            involved (the `state.overflow_mask` bit field), then resets the mask.
+        - While at least `transfer_size` samples are waiting in the ring, a batch is ready to be transferred:
+            - Takes the next free slot index from `batch_ring.next_free_slot`. If every slot is still waiting to be saved,
+                the loop never waits for the save process, since the PicoScope is not read while it waits and its
+                buffer would overflow. Instead:
+                - If the ring still has room for another poll's worth of samples (`BUFFER_SIZE`), the batch stays in
+                    the ring and the PicoScope is polled again; the batch is transferred as soon as a slot is free.
+                - Otherwise the callback is about to overwrite the batch, so it is dropped: `read_head` moves past it
+                    and it is counted in `dropped_batches` and `dropped_samples`. Acquisition goes on and the loss is
+                    reported, rather than the driver silently losing samples; the next saved batch carries its own
+                    acquisition offset, so the gap is recorded in `batches.idx`.
+            - Copies the next `transfer_size` samples of all channels, taken from `read_head & RING_MASK`
+                (in two pieces if the batch wraps around the end of the ring), into the slot. The rows of the ring
+                and of the slot are in the same channel order, so each piece is one 2-D `np.copyto` call.
+                `casting='no'` makes sure both sides are int16, so NumPy copies the rows with plain memory copies
+                and never converts the samples or allocates a temporary array.
+            - Calls `batch_ring.publish(transfer_size, read_head)`, signaling the worker process to save the slot.
+                `read_head` is the acquisition offset of the batch, which the worker records in `batches.idx`, so
+                dropped batches show up as gaps there instead of being silently spliced out of the recording.
+                This is a few stores into shared memory; nothing is pickled and no system call is made.
+            - Logs a message on `batch_log` indicating that data has been put into the ring. The record carries
+                structured fields in `extra` (the monotonic time, batch number, samples, queue depth, fill ratio,
+                and dropped batches and samples), which `start_batch_log` writes to `batches.jsonl`.
+                Whether INFO messages are logged is checked once, in `log_batches`, so no record is built if they are not.
+            - Advances `read_head` by `transfer_size`. Nothing is reallocated or cleared; the callback simply
+                overwrites the ring slots that have already been read.
+        - Reads `time.monotonic()` once into `now`, for the checks below.
+        - If batches were dropped since the last report, logs one warning with their number and the totals so far,
+            at most once per second (`last_drop_report`), so a save process that stays behind does not flood the log.
+        - Every `MONITOR_PERIOD` (50 ms), calls `check_queue_size` to warn if the `batch_ring` is filling up. This catches a
+            save process that has stopped saving altogether, which the save process's own periodic check cannot report.
+            The ring cannot go from empty to full within 50 ms, so checking on every pass (up to every millisecond)
+            would not warn any sooner; `check_queue_size` also logs at most one message per second.
+        - Checks if a `deadline` was computed and if `now` has reached it:
             - If so, logs a message indicating that data collection has stopped due to reaching the specified duration.
             - Breaks out of the loop to end data collection.
-        - Introduces a small delay using `time.sleep(0.001)` to avoid excessive CPU usage.
+        - Waits 1 ms with `exit_event.wait(0.001)` before polling the PicoScope again, to avoid excessive CPU usage.
+            The wait is only skipped when the last call to `get_data` brought in at least half a driver buffer
+            (`BUFFER_SIZE // 2` samples per channel): the loop has fallen behind the PicoScope, and waiting could let
+            the driver buffer overflow. In steady streaming each poll brings in far less than that, so the loop sleeps
+            on every pass and uses little CPU, even when `raise_priority` has made it a real-time thread.
+            Waiting on the `exit_event` instead of `time.sleep` means setting the event ends the wait immediately;
+            an interrupt (e.g., Ctrl+C) is seen within 1 ms. The driver only delivers samples when it is polled
+            (the callback runs inside `ps5000aGetStreamingLatestValues`), so the loop cannot simply block until data arrives.
 
     5. Exception Handling:
         - try...except block is used to catch any errors that might occur during the loop.
         - If an exception occurs and the `exit_event` is not set (i.e., the error is not due to a termination signal), 
             it logs an error message with details of the exception.
-        - finally block is executed regardless of whether an exception occurred. It logs a message indicating that data collection has stopped.
+        - finally block is executed regardless of whether an exception occurred. If the loop was ended by an interrupt
+            (the `exit_flag` is set), it logs that the interrupt was received; this is done here rather than in `signal_handler`.
+            It then logs a message indicating that data collection has stopped, with the number of dropped batches if there were any.
     """
-    global nextSample, bufferComplete
-
-    # Initialize buffers for each channel and the next sample index
-    bufferComplete = {ch: np.zeros(BUFFER_SIZE, dtype=np.int16) for ch in selected_channels}
-    nextSample = 0
-
-    # Calculate transfer size as 10% of buffer size
-    transfer_size = BUFFER_SIZE // 10
-
-    # Get start time for duration tracking
-    start_time = time.time()
+    # Initialize the ring buffer (one row per channel) and the write/read positions in the state shared with the callback
+    ring = np.empty((len(selected_channels), RING_SIZE), dtype=np.int16)
+    state = StreamState(buffers=bufferMax, ring=ring)
+    state.callback = ps.StreamingReadyType(functools.partial(streaming_callback, state))
+    read_head = 0
+    overflows_reported = 0
+    batch_number = 0
+    log_batches = batch_log.isEnabledFor(logging.INFO)
+    dropped_batches = dropped_samples = drops_reported = 0
+    last_drop_report = 0.0  # time.monotonic() of the last report of dropped batches
+    last_monitor = time.monotonic()  # time.monotonic() of the last check_queue_size call
+    last_samples = 0  # write_head after the previous poll
+
+    transfer_size = min(max(transfer_size, MIN_TRANSFER_SIZE), TRANSFER_SIZE)  # A slot holds at most TRANSFER_SIZE samples
+    batches = batch_ring.slots()
+
+    # Compute the deadline once for duration tracking
+    deadline = time.monotonic() + duration if duration is not None else None
 
     try:
-        while not exit_event.is_set():
-            new_samples = get_data() # Get the latest data from the PicoScope
+        while not exit_flag.value and not exit_event.is_set():
+            new_samples = get_data(state) # Get the latest data from the PicoScope
+
+            # Report overflows counted by the callback, outside of the callback itself
+            if state.overflow_events != overflows_reported:
+                logging.warning(f"Overflow occurred in {state.overflow_events - overflows_reported} callback(s) (channel bit mask {state.overflow_mask:#06b}).")
+                overflows_reported = state.overflow_events
+                state.overflow_mask = 0
             
-            # Check if the buffer is ready to be transferred
-            if nextSample >= transfer_size:
-                # Prepare data for saving
-                data_to_save = {ch: bufferComplete[ch][:nextSample].copy() for ch in selected_channels}
-                # Put the data in the queue for the saving process
-                data_queue.put(data_to_save)
-                logging.info(f"Put in Queue {nextSample}")
-
-                # Reset buffer and nextSample for the next batch
-                bufferComplete = {ch: np.zeros(BUFFER_SIZE, dtype=np.int16) for ch in selected_channels}
-                nextSample = 0
+            # Transfer every complete batch waiting in the ring
+            while new_samples - read_head >= transfer_size:
+                fill_ratio = batch_ring.qsize() / batch_ring.maxsize
+                slot = batch_ring.next_free_slot()
+                if slot is None:  # Every slot is still waiting to be saved
+                    if new_samples - read_head + BUFFER_SIZE <= RING_SIZE:
+                        break  # The ring can hold another poll: keep the batch and poll the PicoScope again
+                    # The next poll would overwrite the batch: drop it instead of stalling the PicoScope
+                    dropped_batches += 1
+                    dropped_samples += transfer_size
+                    read_head += transfer_size
+                    continue
+                ring_index = read_head & RING_MASK
+                first_part = min(transfer_size, RING_SIZE - ring_index)  # Samples before the end of the ring
+                # Copy the batch of every channel straight into the shared slot
+                np.copyto(batches[slot, :, :first_part], ring[:, ring_index:ring_index + first_part], casting='no')
+                np.copyto(batches[slot, :, first_part:transfer_size], ring[:, :transfer_size - first_part], casting='no')  # Wrapped part (empty if none)
+                # Tell the saving process which slot to save
+                batch_ring.publish(transfer_size, read_head)
+                if log_batches:
+                    batch_log.info("Put in Queue %d", transfer_size,
+                                   extra={'ts': time.monotonic(), 'batch': batch_number, 'samples': transfer_size,
+                                          'queue_depth': batch_ring.qsize(), 'fill_ratio': fill_ratio,
+                                          'dropped_batches': dropped_batches,
+                                          'dropped_samples': dropped_samples})
+                batch_number += 1
+
+                read_head += transfer_size
+
+                # Grow the batch while the save process keeps up; never shrink it, which would cut the ring's headroom
+                new_transfer_size = min(TRANSFER_SIZE, transfer_size * 5 // 4) if fill_ratio < 0.3 else transfer_size
+                if new_transfer_size != transfer_size:
+                    logging.info(f"Transfer size changed from {transfer_size} to {new_transfer_size} samples (queue {fill_ratio:.0%} full)")
+                    transfer_size = new_transfer_size
+
+            now = time.monotonic()
+
+            # Report batches dropped because the save process fell behind, at most once per second
+            if dropped_batches != drops_reported and now - last_drop_report >= 1:
+                logging.warning(f"Save process fell behind: dropped {dropped_batches - drops_reported} batch(es) "
+                                f"({dropped_batches} batches, {dropped_samples} samples per channel in total).")
+                drops_reported = dropped_batches
+                last_drop_report = now
+
+            # Check the fill level of the batch ring every MONITOR_PERIOD rather than on every pass
+            if now - last_monitor >= MONITOR_PERIOD:
+                check_queue_size(batch_ring)
+                last_monitor = now
 
             # Check if the specified duration has elapsed
-            if duration is not None and time.time() - start_time >= duration:
+            if deadline is not None and now >= deadline:
                 logging.info(f"Specified duration of {duration} seconds reached. Stopping data collection.")
                 break
-            
-            time.sleep(0.001) # Small delay to prevent excessive CPU usage
+
+            # Wait briefly to prevent excessive CPU usage, unless the last poll brought in half a driver buffer or more
+            if new_samples - last_samples < BUFFER_SIZE // 2:
+                exit_event.wait(0.001)
+            last_samples = new_samples
 
     except Exception as e:
         if not exit_event.is_set():
             logging.error(f"Error in main_loop: {e}")
     finally:
+        if exit_flag.value:
+            logging.info("Interrupt received, preparing to exit...")
+        if dropped_batches:
+            logging.warning(f"{dropped_batches} batch(es) ({dropped_samples} samples per channel) were dropped during the recording.")
         logging.info("Data collection stopped.")
 
-def check_queue_size(queue, warning_threshold=0.5, critical_threshold=0.8):
+last_queue_warning_time = 0.0  # time.monotonic() of the last warning logged by check_queue_size, in this process
+
+def check_queue_size(queue, warning_threshold=0.5, critical_threshold=0.8, min_interval=1.0):
     """
     Monitors the size of a data queue and logs warnings or critical alerts if it becomes too full.
 
@@ -676,9 +1288,10 @@ def check_queue_size(queue, warning_threshold=0.5, critical_threshold=0.8):
     if a warning or critical alert is needed.
 
     Args:
-        queue (multiprocessing.Queue): The queue object to check.
+        queue (BatchRing): The queue object to check.
         warning_threshold (float, optional): The fill ratio at which a warning should be logged (default: 0.5, meaning 50% full).
         critical_threshold (float, optional): The fill ratio at which a critical alert should be logged (default: 0.8, meaning 80% full).
+        min_interval (float, optional): The minimum time in seconds between two logged messages (default: 1 second).
 
     Returns:
         float: The current fill ratio of the queue (a value between 0 and 1).
@@ -687,7 +1300,8 @@ def check_queue_size(queue, warning_threshold=0.5, critical_threshold=0.8):
 
     1. Queue Size Calculation:
         - Gets the current number of items in the queue using `queue.qsize()` and stores it in `current_size`.
-        - Gets the maximum capacity of the queue using `queue._maxsize` and stores it in `max_size`.
+            For a `BatchRing` this reads two shared counters, with no lock and no system call.
+        - Gets the maximum capacity of the queue using `queue.maxsize` and stores it in `max_size`.
         - Calculates the `fill_ratio` as `current_size` divided by `max_size`.
             - If the `max_size` is 0 (meaning the queue is unbounded), the `fill_ratio` is set to 0.
 
@@ -699,19 +1313,28 @@ def check_queue_size(queue, warning_threshold=0.5, critical_threshold=0.8):
             - If true, logs a WARNING level message indicating that the queue is filling up, 
             along with the current and maximum size and the fill ratio as a percentage.
         - If neither threshold is met, no message is logged.
+        - A message is only logged if at least `min_interval` seconds have passed since the last one (tracked with
+            `time.monotonic()` in `last_queue_warning_time`), so a queue that stays above a threshold does not flood the log.
+            The returned `fill_ratio` is not affected by this.
 
     3. Return Fill Ratio:
         - Returns the calculated `fill_ratio` so it can be used by other parts of the code if needed.
 
     Example Usage:
-        fill_level = check_queue_size(data_queue)
+        fill_level = check_queue_size(batch_ring)
         if fill_level > 0.9:  # Custom check
             # Take some action to prevent the queue from getting completely full
     """
     current_size = queue.qsize()  # Get the current number of items in the queue
-    max_size = queue._maxsize  # Get the maximum capacity of the queue
+    max_size = queue.maxsize  # Get the maximum capacity of the queue
     fill_ratio = current_size / max_size if max_size > 0 else 0  # Calculate the fill ratio
 
+    # Log at most one message per min_interval
+    global last_queue_warning_time
+    if fill_ratio < warning_threshold or time.monotonic() - last_queue_warning_time < min_interval:
+        return fill_ratio
+    last_queue_warning_time = time.monotonic()
+
     # Log a critical message if the queue is very full
     if fill_ratio >= critical_threshold:
         logging.critical(f"Queue is critically full! {current_size}/{max_size} ({fill_ratio:.2%})")
@@ -751,38 +1374,51 @@ if __name__ == "__main__":
         - Calls the `get_user_settings` function to get configuration settings from the user interactively.
         - Stores the returned settings dictionary in the `settings` variable.
         - Extracts the `selected_channels` from the settings.
+        - Calls `start_log_listener` so that from now on every log message is written to the console by a background thread.
+            Until then messages are written straight away, so the ones logged while the user answers the prompts
+            appear in order with the prompt text instead of in the middle of it.
 
     4. Initialize and Configure PicoScope:
         - Calls `open_device` to establish a connection to the PicoScope using the resolution specified in the settings.
         - Calls `setup_channels` to configure the selected channels with their respective voltage ranges.
         - Calls `set_buffers` to allocate memory buffers for the selected channels.
-        - Calls `run_streaming` to start the PicoScope in streaming mode at the specified sampling rate.
-        - Records the `start_time` for later calculations.
+        - Calls `channel_scales` and `save_scales` to write the millivolts per ADC count of every channel to `scales.json`.
+        - Calls `start_batch_log` to write the metrics of every transferred batch to `batches.jsonl`.
 
-    5. Set Up Data Queue and Saving Process:
-        - Creates a multiprocessing `Queue` named `data_queue` with a maximum size of 20. This queue will hold data batches before they are saved to disk.
+    5. Set Up the Batch Ring and Saving Process:
+        - Creates `batch_ring`, a `BatchRing` with room for `NUM_SLOTS` batches of every selected channel in shared memory.
+            Batches are copied into this memory once and read from it by the save process, instead of being pickled through a queue.
         - Creates a multiprocessing `Process` named `save_process`.
             - `target=save_data_worker`: Specifies the function that will run in this process.
-            - `args=(data_queue, output_folder, exit_event)`: Passes the necessary arguments to the `save_data_worker` function.
+            - `args=(batch_ring, selected_channels, output_folder, settings['resolution'], log_queue)`: Passes the necessary arguments to the `save_data_worker` function.
         - Starts the `save_process` to run in parallel with the main data collection loop.
 
-    6. Main Data Collection Loop:
+    6. Start Streaming:
+        - Calls `pin_to_core('ACQ_CORE')` and `raise_priority()` for the acquisition process. This happens after the
+            `save_process` has started, so the save process does not inherit the acquisition core or priority.
+        - Calls `run_streaming` to start the PicoScope in streaming mode at the specified sampling rate.
+        - Records the `start_time` with `time.monotonic()` for later calculations.
+
+    7. Main Data Collection Loop:
         - Encloses the main data collection loop in a `try...except...finally` block to handle potential errors gracefully.
         - Calls `main_loop` to start data acquisition from the selected channels.
         - This function will run until the specified duration is reached or the `exit_event` is set.
 
-    7. Error Handling:
+    8. Error Handling:
         - If any exceptions occur during data collection (except those related to the termination signal), an error message is logged.
 
-    8. Clean Up and Close:
+    9. Clean Up and Close:
         - `finally` block is always executed, whether an error occurred or not.
-        - Sets the `exit_event` to signal the termination of both the main loop and the `save_process`.
+        - Sets the `exit_flag` and the `exit_event` to signal the termination of the streaming callback, the main loop and the `save_process`.
         - Calculates the `process_time` by subtracting the `start_time` from the current time.
         - Logs a message indicating the total processing time.
-        - Puts `None` in the `data_queue` to signal the save process to terminate.
-        - Waits for the `save_process` to finish with a timeout of 5 seconds.
+        - Closes the `batch_ring` to signal the save process to terminate.
+        - Waits for the `save_process` to finish with a timeout of 30 seconds. The save process first saves every batch still
+            waiting in the ring (up to `NUM_SLOTS` full batches), so this can take a few seconds on a slow disk.
         - If the `save_process` is still alive after the timeout, it's forcibly terminated and then joined to ensure it completes.
+        - Stops the `batch_log_listener`, which writes the remaining batch records and closes `batches.jsonl`.
         - Logs messages to confirm file saving, device closing, and program termination.
+        - Stops the `log_listener`, which writes the remaining log messages to the console.
     """
     print("*****PicoScope 5000A Data Acquisition Tool by M.J.*****\n\n")
     
@@ -798,39 +1434,48 @@ if __name__ == "__main__":
     # Get user settings
     settings = get_user_settings()
     selected_channels = settings['channels']
+    log_listener, log_queue = start_log_listener()  # Write log messages from a background thread, now that the prompts are done
     
     # Initialize and set up the PicoScope
     open_device(settings['resolution'])
     setup_channels(selected_channels, settings['voltage_ranges'])
     set_buffers(selected_channels)
-    run_streaming(settings['sampling_rate'])
-    
-    start_time = time.time()
+    save_scales(output_folder, channel_scales(selected_channels, settings['voltage_ranges'], settings['resolution']), settings['voltage_ranges'])
+    batch_log_listener = start_batch_log(output_folder)
 
-    # Set up the data queue and start the save process
-    data_queue = multiprocessing.Queue(maxsize=20)
-    save_process = multiprocessing.Process(target=save_data_worker, args=(data_queue, output_folder, exit_event))
+    # Set up the shared batch ring, then start the save process
+    batch_ring = BatchRing(len(selected_channels))
+    save_process = multiprocessing.Process(target=save_data_worker,
+                                           args=(batch_ring, selected_channels, output_folder, settings['resolution'], log_queue))
     save_process.start()
+
+    # Pin and prioritise the acquisition process (after the save process has started), then start streaming
+    pin_to_core('ACQ_CORE')
+    raise_priority()
+    run_streaming(settings['sampling_rate'])
+    
+    start_time = time.monotonic()
     
     try:
         # Start the main data collection loop
-        main_loop(selected_channels, data_queue, settings['duration'], exit_event)
+        main_loop(selected_channels, batch_ring, settings['duration'], exit_event)
     except Exception as e:
         if not exit_event.is_set():
             logging.error(f"Error in main process: {e}")
             exit()
     finally:
         # Clean up and close the program
+        exit_flag.value = 1
         exit_event.set()
-        end_time = time.time()
+        end_time = time.monotonic()
         process_time = end_time - start_time
         logging.info(f"Process time: {process_time} seconds")
 
-        # Ensure the save process receives the termination signal
-        data_queue.put(None)
+        # Ensure the save process receives the termination signal; it saves the batches still in the ring, then exits
+        batch_ring.close()
         
         # Wait for the save process to finish with a timeout
-        save_process.join(timeout=5)
+        save_process.join(timeout=30)
         
         # If the process is still alive after timeout, terminate it
         if save_process.is_alive():
@@ -838,9 +1483,11 @@ if __name__ == "__main__":
             save_process.terminate()
             save_process.join()
 
+        batch_log_listener.stop()
         logging.info(f"Files saved to {output_folder}")
         ps.ps5000aStop(chandle)
         ps.ps5000aCloseUnit(chandle)
         logging.info("Device closed")
         logging.info("Data saved and program terminated")
+        log_listener.stop()
         exit()